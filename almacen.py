@@ -0,0 +1,155 @@
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import numpy as np
+import pandas as pd
+
+# Directorio compartido por todos los workers de gunicorn (y sus procesos auxiliares).
+DIRECTORIO_CACHE = os.environ.get('ANALYTICA_CACHE_DIR', os.path.join(tempfile.gettempdir(), 'analyticapro_cache'))
+# Tamaño máximo de la caché; al superarlo se borran los datasets usados hace más tiempo.
+MAX_BYTES_CACHE = int(os.environ.get('ANALYTICA_CACHE_MAX_MB', 2048)) * 1024 ** 2
+
+
+def directorio_dataset(data_path):
+    """Directorio de caché de un CSV; cambia si el archivo se modifica."""
+    ruta = os.path.abspath(data_path)
+    st = os.stat(data_path)
+    prefijo = hashlib.sha1(ruta.encode('utf-8')).hexdigest()[:20]
+    version = hashlib.sha1(f"{st.st_mtime_ns}|{st.st_size}".encode('utf-8')).hexdigest()[:20]
+    return os.path.join(DIRECTORIO_CACHE, f"{prefijo}-{version}")
+
+
+def _eliminar_versiones_anteriores(directorio):
+    """
+    Borra las copias de versiones previas del mismo CSV. Los procesos que aún las tengan
+    mapeadas siguen leyéndolas: el sistema libera el espacio al cerrar el último mapeo.
+    """
+    prefijo = os.path.basename(directorio).split('-')[0]
+    for nombre in os.listdir(DIRECTORIO_CACHE):
+        anterior = os.path.join(DIRECTORIO_CACHE, nombre)
+        if nombre.startswith(prefijo + '-') and anterior != directorio:
+            shutil.rmtree(anterior, ignore_errors=True)
+
+
+def _tamano_directorio(directorio):
+    try:
+        return sum(e.stat().st_size for e in os.scandir(directorio) if e.is_file())
+    except FileNotFoundError:
+        return 0
+
+
+def limpiar_cache(actual=None, max_bytes=None):
+    """
+    Borra los datasets cuyo CSV de origen ya no existe y, si la caché sigue superando
+    max_bytes (MAX_BYTES_CACHE por defecto), los usados hace más tiempo hasta caber.
+    Nunca borra 'actual', el directorio que el proceso está usando.
+    """
+    max_bytes = MAX_BYTES_CACHE if max_bytes is None else max_bytes
+    vigentes = []
+    for nombre in os.listdir(DIRECTORIO_CACHE):
+        directorio = os.path.join(DIRECTORIO_CACHE, nombre)
+        if directorio == actual or not os.path.isdir(directorio):
+            continue
+        try:
+            with open(os.path.join(directorio, 'origen.json'), 'r', encoding='utf-8') as f:
+                origen = json.load(f)['ruta']
+            uso = os.stat(directorio).st_mtime
+        except (OSError, ValueError, KeyError):
+            # Aún sin origen.json: otro proceso lo está creando
+            continue
+        if not os.path.exists(origen):
+            shutil.rmtree(directorio, ignore_errors=True)
+        else:
+            vigentes.append((uso, directorio))
+
+    total = sum(_tamano_directorio(d) for _, d in vigentes)
+    if actual is not None:
+        total += _tamano_directorio(actual)
+    for _, directorio in sorted(vigentes):
+        if total <= max_bytes:
+            break
+        total -= _tamano_directorio(directorio)
+        shutil.rmtree(directorio, ignore_errors=True)
+
+
+def _rutas_columna(directorio, columna):
+    nombre = hashlib.sha1(columna.encode('utf-8')).hexdigest()[:16]
+    return os.path.join(directorio, f"{nombre}.json"), os.path.join(directorio, f"{nombre}.npy")
+
+
+def _reemplazar_atomico(directorio, ruta, escribir):
+    """Escribe en un temporal y lo renombra, para que otro proceso nunca lea un archivo a medias."""
+    fd, tmp = tempfile.mkstemp(dir=directorio, suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            escribir(f)
+        os.replace(tmp, ruta)
+    except BaseException:
+        os.unlink(tmp)
+        raise
+
+
+def _guardar_columna(directorio, columna, serie):
+    ruta_indice, ruta_datos = _rutas_columna(directorio, columna)
+    if pd.api.types.is_numeric_dtype(serie) and not pd.api.types.is_bool_dtype(serie):
+        datos, indice = serie.to_numpy(), {'columna': columna, 'tipo': 'numerica'}
+    else:
+        categorica = pd.Categorical(serie)
+        datos = categorica.codes.astype(np.int32)
+        indice = {'columna': columna, 'tipo': 'categorica', 'categorias': categorica.categories.tolist()}
+    # El índice se publica antes que los datos: si existe el .npy, su .json también existe
+    _reemplazar_atomico(directorio, ruta_indice, lambda f: f.write(json.dumps(indice, default=str).encode('utf-8')))
+    _reemplazar_atomico(directorio, ruta_datos, lambda f: np.save(f, datos))
+
+
+def cargar(data_path, columnas=None):
+    """
+    Devuelve {columna: (arreglo, categorias)} con arreglos de solo lectura mapeados en memoria.
+    Las columnas numéricas conservan su tipo (int64/float64); las categóricas son códigos int32 (-1 = vacío) y
+    'categorias' es la lista de valores. Solo el primer proceso que pide una columna lee el
+    CSV; el resto se adjunta a la misma copia sin copiarla ni serializarla.
+    Lo que se comparte es el parseo y los arreglos de solo lectura: cualquier transformación
+    posterior (p. ej. train_test_split en kmedias) crea una copia privada del proceso.
+    Cada vez que se escriben columnas nuevas se aplica limpiar_cache.
+    """
+    directorio = directorio_dataset(data_path)
+    if not os.path.isdir(directorio):
+        os.makedirs(directorio, exist_ok=True)
+        _eliminar_versiones_anteriores(directorio)
+        origen = json.dumps({'ruta': os.path.abspath(data_path)}).encode('utf-8')
+        _reemplazar_atomico(directorio, os.path.join(directorio, 'origen.json'), lambda f: f.write(origen))
+    else:
+        # La fecha de modificación del directorio marca su último uso para la limpieza
+        os.utime(directorio)
+    if columnas is None:
+        columnas = pd.read_csv(data_path, nrows=0).columns.tolist()
+
+    faltantes = [c for c in columnas if not os.path.exists(_rutas_columna(directorio, c)[1])]
+    if faltantes:
+        df = pd.read_csv(data_path, usecols=faltantes)
+        for columna in faltantes:
+            _guardar_columna(directorio, columna, df[columna])
+        del df
+        limpiar_cache(actual=directorio)
+
+    resultado = {}
+    for columna in columnas:
+        ruta_indice, ruta_datos = _rutas_columna(directorio, columna)
+        with open(ruta_indice, 'r', encoding='utf-8') as f:
+            indice = json.load(f)
+        resultado[columna] = (np.load(ruta_datos, mmap_mode='r'), indice.get('categorias'))
+    return resultado
+
+
+def a_dataframe(data_path, columnas=None):
+    """
+    DataFrame cuyas columnas numéricas son vistas sobre la copia compartida; las categóricas
+    se reconstruyen en cada proceso a partir de sus códigos.
+    """
+    arreglos = cargar(data_path, columnas)
+    return pd.DataFrame({
+        columna: arreglo if categorias is None else pd.Categorical.from_codes(arreglo, categorias)
+        for columna, (arreglo, categorias) in arreglos.items()
+    }, copy=False)
@@ -1,4 +1,4 @@
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify
 from flasgger import Swagger
 import kmedias as kme
 import kmodas as kmo
@@ -7,6 +7,8 @@ import chimerge as cm
 import estandarizacion as est
 import normalizacion as norm
 import escala_log as log
+import planificador as plan
+import transmision as tx
 import os
 
 app = Flask("AnalyticaPro")
@@ -17,6 +19,23 @@ app.config['SWAGGER'] = {
     "specs_route": "/algoritmos/"
 }
 swagger = Swagger(app)
+planificador = plan.desde_entorno()
+
+def leer_numero(req_data, nombre, tipo=int, defecto=None, minimo=None):
+    """Lee una opción numérica del cuerpo JSON; lanza ValueError con un mensaje para el cliente."""
+    valor = req_data.get(nombre, defecto)
+    if valor is None:
+        return None
+    descripcion = 'an integer' if tipo is int else 'a number'
+    if isinstance(valor, bool) or (tipo is int and isinstance(valor, float) and not valor.is_integer()):
+        raise ValueError(f"'{nombre}' must be {descripcion}")
+    try:
+        valor = tipo(valor)
+    except (TypeError, ValueError):
+        raise ValueError(f"'{nombre}' must be {descripcion}")
+    if minimo is not None and valor < minimo:
+        raise ValueError(f"'{nombre}' must be at least {minimo}")
+    return valor
 
 @app.route('/')
 def welcome():
@@ -61,11 +80,61 @@ def run_algorithm():
             inicio:
               type: string
               description: Name of the starting column for analysis range (for ARBOL).
+            columnas:
+              type: array
+              items:
+                type: string
+              description: Columns to discretize (for CHIMERGE). Defaults to X and Y.
+            clase:
+              type: string
+              description: Name of the class column (for CHIMERGE). Defaults to CLASE.
+            max_intervalos:
+              type: integer
+              description: Stop merging at this number of intervals (for CHIMERGE).
+            significancia:
+              type: number
+              description: Stop merging once every adjacent pair is significant at this level, e.g. 0.05 (for CHIMERGE).
+            traza_completa:
+              type: boolean
+              description: Include every initial interval and merge in the report instead of the first and last 20 (for CHIMERGE).
+            modo:
+              type: string
+              description: Set to 'streaming' to fit KMEDIAS in chunks with MiniBatchKMeans (for files larger than memory).
+              enum: ['completo', 'streaming']
+            n_clusters:
+              type: integer
+              description: Number of clusters for streaming KMEDIAS.
+            chunksize:
+              type: integer
+              description: Rows read per chunk for streaming KMEDIAS.
+            epochs:
+              type: integer
+              description: Maximum passes over the file for streaming KMEDIAS.
+            stream:
+              type: boolean
+              description: Stream the PDF report back as a chunked response, page by page, instead of returning its path (not available for ARBOL).
+            max_depth:
+              type: integer
+              description: Maximum tree depth (for ARBOL).
+            min_samples_split:
+              type: integer
+              description: Minimum number of rows required to split a node (for ARBOL).
+            min_gain:
+              type: number
+              description: Minimum information gain required to split a node (for ARBOL).
+            max_nodes:
+              type: integer
+              description: Maximum number of decision nodes to build (for ARBOL).
+            max_nodos_visibles:
+              type: integer
+              description: Display budget for the rendered tree; larger subtrees are collapsed (for ARBOL).
     responses:
       200:
-        description: Algorithm executed successfully. Returns path(s) to the output PDF(s).
+        description: Algorithm executed successfully. Returns path(s) to the output PDF(s), or the PDF itself when 'stream' is set.
       400:
         description: Bad request due to missing or invalid parameters.
+      429:
+        description: Server is at its CPU or memory budget. Retry after the number of seconds in the Retry-After header.
       500:
         description: Internal server error during algorithm execution.
     """
@@ -85,39 +154,137 @@ def run_algorithm():
     output_filename = f"{os.path.splitext(os.path.basename(data_path))[0]}_{algoritmo.lower()}_output.pdf"
     output_path = os.path.join(os.path.dirname(data_path), output_filename)
 
+    # Las opciones que usa la estimación de costo se validan antes de admitir la petición
+    opciones = {'modo': req_data.get('modo')}
+    if algoritmo == 'KMEDIAS' and opciones['modo'] == 'streaming':
+        try:
+            opciones['n_clusters'] = leer_numero(req_data, 'n_clusters', defecto=3, minimo=1)
+            opciones['chunksize'] = leer_numero(req_data, 'chunksize', defecto=100_000, minimo=1)
+            opciones['epochs'] = leer_numero(req_data, 'epochs', defecto=3, minimo=1)
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+
+    try:
+        ticket, retry_after = planificador.admitir(algoritmo, data_path, opciones)
+    except OSError as e:
+        return jsonify({"error": f"Data file could not be read: {e}"}), 400
+    if ticket is None:
+        respuesta = jsonify({"error": "Server is busy, try again later.", "retry_after": retry_after})
+        respuesta.headers['Retry-After'] = str(retry_after)
+        return respuesta, 429
+
+    en_flujo = bool(req_data.get('stream'))
+    liberar_al_salir = True
+
+    def pdf_en_flujo(tarea):
+        nonlocal liberar_al_salir
+        # El ticket se libera cuando termina la transmisión, no al salir de la vista
+        liberar_al_salir = False
+        bloques = tx.ejecutar_en_flujo(tarea, al_terminar=lambda: planificador.liberar(ticket))
+        if bloques is None:
+            return jsonify({"error": f"{algoritmo} failed before producing a report. Check the input file and parameters."}), 500
+        return Response(
+            bloques,
+            mimetype='application/pdf',
+            headers={'Content-Disposition': f'inline; filename="{output_filename}"'}
+        )
+
     try:
         if algoritmo in ['ESTANDARIZACION', 'NORMALIZACION', 'ESCALA_LOG']:
             nombre_columna = req_data.get('nombre_columna')
             if not nombre_columna:
                 return jsonify({"error": f"Missing 'nombre_columna' for {algoritmo}"}), 400
             
-            if algoritmo == 'ESTANDARIZACION':
-                est.estandarizar_datos(data_path, nombre_columna, output_pdf_path=output_path)
-            elif algoritmo == 'NORMALIZACION':
-                norm.normalizar_datos(data_path, nombre_columna, output_pdf_path=output_path)
-            elif algoritmo == 'ESCALA_LOG':
-                log.transformar_log(data_path, nombre_columna, output_pdf_path=output_path)
-            
+            def tarea(destino):
+                if algoritmo == 'ESTANDARIZACION':
+                    est.estandarizar_datos(data_path, nombre_columna, output_pdf_path=destino)
+                elif algoritmo == 'NORMALIZACION':
+                    norm.normalizar_datos(data_path, nombre_columna, output_pdf_path=destino)
+                elif algoritmo == 'ESCALA_LOG':
+                    log.transformar_log(data_path, nombre_columna, output_pdf_path=destino)
+
+            if en_flujo:
+                return pdf_en_flujo(tarea)
+            tarea(output_path)
             return jsonify({"message": f"{algoritmo} executed successfully.", "output_path": output_path})
 
         elif algoritmo == 'CHIMERGE':
-            cm.run_chimerge(data_path, output_pdf_path=output_path)
-            return jsonify({"message": "CHIMERGE executed successfully.", "output_path": output_path})
+            def tarea(destino):
+                return cm.run_chimerge(
+                    data_path, output_pdf_path=destino,
+                    columnas=req_data.get('columnas'),
+                    class_col=req_data.get('clase', 'CLASE'),
+                    max_intervalos=req_data.get('max_intervalos'),
+                    significancia=req_data.get('significancia'),
+                    traza_completa=bool(req_data.get('traza_completa'))
+                )
+
+            try:
+                if en_flujo:
+                    return pdf_en_flujo(tarea)
+                modelo = tarea(output_path)
+            except KeyError as e:
+                return jsonify({"error": e.args[0]}), 400
+            except ValueError as e:
+                return jsonify({"error": str(e)}), 400
+            return jsonify({
+                "message": "CHIMERGE executed successfully.",
+                "output_path": output_path,
+                "cortes": {col: cortes.tolist() for col, cortes in modelo.items()}
+            })
         
         elif algoritmo == 'KMODAS':
+            if en_flujo:
+                return pdf_en_flujo(lambda destino: kmo.run_kmodas(data_path, output_pdf_path=destino))
             kmo.run_kmodas(data_path, output_pdf_path=output_path)
             return jsonify({"message": "KMODAS executed successfully.", "output_path": output_path})
 
         elif algoritmo == 'KMEDIAS':
+            if req_data.get('modo') == 'streaming':
+                labels_path = output_path.replace('.pdf', '_labels.csv')
+
+                def tarea(destino):
+                    return kme.run_kmedias_streaming(
+                        data_path, output_pdf_path=destino,
+                        n_clusters=opciones['n_clusters'],
+                        chunksize=opciones['chunksize'],
+                        epochs=opciones['epochs'],
+                        labels_path=labels_path
+                    )
+
+                if en_flujo:
+                    return pdf_en_flujo(tarea)
+                historial = tarea(output_path)
+                if historial is None:
+                    return jsonify({"error": "Failed to run streaming KMEDIAS"}), 500
+                return jsonify({
+                    "message": "KMEDIAS executed successfully.",
+                    "output_path": output_path,
+                    "labels_path": labels_path,
+                    "convergencia": historial
+                })
+            if en_flujo:
+                return pdf_en_flujo(lambda destino: kme.run_kmedias(data_path, output_pdf_path=destino))
             kme.run_kmedias(data_path, output_pdf_path=output_path)
             return jsonify({"message": "KMEDIAS executed successfully.", "output_path": output_path})
 
         elif algoritmo == 'ARBOL':
+            if en_flujo:
+                return jsonify({"error": "Streaming is not supported for ARBOL, which writes two files"}), 400
             objetivo = req_data.get('objetivo')
             inicio = req_data.get('inicio')
             if not all([objetivo, inicio]):
                 return jsonify({"error": "Missing 'objetivo' or 'inicio' for ARBOL"}), 400
 
+            try:
+                max_depth = leer_numero(req_data, 'max_depth', minimo=0)
+                min_samples_split = leer_numero(req_data, 'min_samples_split', defecto=2, minimo=2)
+                min_gain = leer_numero(req_data, 'min_gain', tipo=float, defecto=0.0, minimo=0.0)
+                max_nodes = leer_numero(req_data, 'max_nodes', minimo=0)
+                max_nodos_visibles = leer_numero(req_data, 'max_nodos_visibles', defecto=200, minimo=1)
+            except ValueError as e:
+                return jsonify({"error": str(e)}), 400
+
             encabezado, datos = tree.cargar_csv(data_path)
             if not encabezado or not datos:
                 return jsonify({"error": "Failed to load data for ARBOL algorithm"}), 500
@@ -126,12 +293,19 @@ def run_algorithm():
             idx_inicio_int = encabezado.index(inicio)
             indices_vars = list(range(idx_inicio_int, idx_final_int))
             
-            arbol_resultado = tree.construir_arbol(datos, encabezado, indices_vars, idx_final_int)
+            arbol_resultado = tree.construir_arbol(
+                datos, encabezado, indices_vars, idx_final_int,
+                max_depth=max_depth,
+                min_samples_split=min_samples_split,
+                min_gain=min_gain,
+                max_nodes=max_nodes
+            )
             
             output_pdf_grafico = output_path.replace('.pdf', '_visual.pdf')
             output_pdf_reglas = output_path.replace('.pdf', '_reglas.pdf')
 
-            tree.dibujar_arbol_pdf(arbol_resultado, output_pdf_grafico)
+            tree.dibujar_arbol_pdf(arbol_resultado, output_pdf_grafico,
+                                   max_nodos_visibles=max_nodos_visibles)
             
             reglas_texto = "\n".join(tree.get_reglas_dec_text(arbol_resultado))
             with tree.PdfPages(output_pdf_reglas) as pdf:
@@ -150,6 +324,9 @@ def run_algorithm():
 
     except Exception as e:
         return jsonify({"error": f"An error occurred during execution: {str(e)}"}), 500
+    finally:
+        if liberar_al_salir:
+            planificador.liberar(ticket)
 
 if __name__ == '__main__':
     app.run()
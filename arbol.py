@@ -1,18 +1,19 @@
 import csv
 import math
-from collections import Counter
+from collections import Counter, deque
+import itertools
 import graphviz
 import sys
 import io
-import matplotlib.pyplot as plt
+from matplotlib.figure import Figure
 from matplotlib.backends.backend_pdf import PdfPages
 
 def text_to_pdf(text, pdf):
-    fig = plt.figure(figsize=(8.27, 11.69))  # A4 size
-    plt.axis('off')
-    plt.text(0.05, 0.95, text, va='top', ha='left', wrap=True, fontsize=8, family='monospace')
+    fig = Figure(figsize=(8.27, 11.69))  # A4 size
+    ax = fig.subplots()
+    ax.axis('off')
+    ax.text(0.05, 0.95, text, va='top', ha='left', wrap=True, fontsize=8, family='monospace')
     pdf.savefig(fig)
-    plt.close(fig)
 
 def entropia(datos, idx_final):
     total = len(datos)
@@ -45,22 +46,55 @@ def categoria_mayoritaria(datos, idx_final):
     if not datos: return "SinDatos"
     return Counter(f[idx_final] for f in datos).most_common(1)[0][0]
 
-def construir_arbol(datos, encabezado, indices_vars, idx_final):
-    categorias_en_nodo = set(f[idx_final] for f in datos)
-    if len(categorias_en_nodo) == 1: return list(categorias_en_nodo)[0]
-    if not indices_vars: return categoria_mayoritaria(datos, idx_final)
-
-    mejor_idx, mejor_ganancia = split(datos, idx_final, indices_vars)
-    if mejor_idx is None or mejor_ganancia <= 0:
-        return categoria_mayoritaria(datos, idx_final)
-
-    nombre_var = encabezado[mejor_idx]
-    nodo = {nombre_var: {}}
-    nuevos_indices = [i for i in indices_vars if i != mejor_idx]
-    for valor in set(f[mejor_idx] for f in datos):
-        subconjunto = [f for f in datos if f[mejor_idx] == valor]
-        nodo[nombre_var][valor] = construir_arbol(subconjunto, encabezado, nuevos_indices, idx_final)
-    return nodo
+def construir_arbol(datos, encabezado, indices_vars, idx_final, max_depth=None,
+                    min_samples_split=2, min_gain=0.0, max_nodes=None):
+    """
+    Construye el árbol ID3 expandiendo los nodos por niveles (en anchura).
+    max_depth, min_samples_split, min_gain y max_nodes detienen el crecimiento antes
+    de tiempo (pre-poda): el nodo se convierte en hoja con la categoría mayoritaria.
+    Al expandir por niveles, el presupuesto de max_nodes se reparte entre todas las ramas.
+    """
+    def dividir(subconjunto, indices, profundidad):
+        """Devuelve la hoja del nodo, o (variable, hijos, nuevos_indices) si conviene dividirlo."""
+        categorias_en_nodo = set(f[idx_final] for f in subconjunto)
+        if len(categorias_en_nodo) == 1: return list(categorias_en_nodo)[0]
+        if not indices: return categoria_mayoritaria(subconjunto, idx_final)
+        if max_depth is not None and profundidad >= max_depth: return categoria_mayoritaria(subconjunto, idx_final)
+        if len(subconjunto) < min_samples_split: return categoria_mayoritaria(subconjunto, idx_final)
+
+        mejor_idx, mejor_ganancia = split(subconjunto, idx_final, indices)
+        if mejor_idx is None or mejor_ganancia <= 0 or mejor_ganancia < min_gain:
+            return categoria_mayoritaria(subconjunto, idx_final)
+
+        hijos = {}
+        for f in subconjunto:
+            hijos.setdefault(f[mejor_idx], []).append(f)
+        return encabezado[mejor_idx], hijos, [i for i in indices if i != mejor_idx]
+
+    raiz = {}
+    # Cada entrada: (filas, variables disponibles, profundidad, dict padre, valor de la rama)
+    cola = deque([(datos, indices_vars, 0, raiz, None)])
+    nodos = 0
+    while cola:
+        subconjunto, indices, profundidad, padre, valor = cola.popleft()
+        if max_nodes is not None and nodos >= max_nodes:
+            resultado = categoria_mayoritaria(subconjunto, idx_final)
+        else:
+            resultado = dividir(subconjunto, indices, profundidad)
+        if isinstance(resultado, tuple):
+            nombre_var, hijos, nuevos_indices = resultado
+            nodos += 1
+            resultado = {nombre_var: {}}
+            for valor_hijo, filas_hijo in hijos.items():
+                resultado[nombre_var][valor_hijo] = None  # se completa al salir de la cola
+                cola.append((filas_hijo, nuevos_indices, profundidad + 1, resultado[nombre_var], valor_hijo))
+        padre[valor] = resultado
+    return raiz[None]
+
+def contar_nodos(arbol):
+    if not isinstance(arbol, dict): return 1
+    var = list(arbol.keys())[0]
+    return 1 + sum(contar_nodos(sub) for sub in arbol[var].values())
 
 def get_reglas_dec_text(arbol, regla_actual="Si", reglas_lista=None):
     if reglas_lista is None: reglas_lista = []
@@ -86,22 +120,39 @@ def cargar_csv(ruta):
         print(f"Error al cargar CSV: {e}", file=sys.stderr)
         return None, None
 
-def dibujar_arbol_pdf(arbol, nombre_salida="arbol_decision_output.pdf"):
+def dibujar_arbol_pdf(arbol, nombre_salida="arbol_decision_output.pdf", max_nodos_visibles=200):
+    """
+    Dibuja el árbol con graphviz. Cuando se agota el presupuesto de max_nodos_visibles,
+    los subárboles restantes se colapsan en un único nodo resumen.
+    """
     dot = graphviz.Digraph(comment='Árbol de Decisión')
     dot.attr('node', shape='box', style='rounded,filled', fillcolor='lightgrey')
-    
+    ids = itertools.count()
+    dibujados = [0]
+
+    def agregar_resumen(padre, restantes):
+        node_id = str(next(ids))
+        total = sum(contar_nodos(sub) for _, sub in restantes)
+        dot.node(node_id, f"... ({total} nodos ocultos)", fillcolor='white', style='rounded,dashed,filled')
+        dot.edge(padre, node_id, label=f"{len(restantes)} ramas")
+
     def agregar_nodos(subarbol, padre=None, etiqueta=''):
-        node_id = str(id(subarbol))
+        node_id = str(next(ids))
+        dibujados[0] += 1
         if not isinstance(subarbol, dict):
-            dot.node(node_id, subarbol, fillcolor='lightblue')
+            dot.node(node_id, str(subarbol), fillcolor='lightblue')
             if padre: dot.edge(padre, node_id, label=etiqueta)
             return
         var = list(subarbol.keys())[0]
         dot.node(node_id, var)
         if padre: dot.edge(padre, node_id, label=etiqueta)
-        for val, sub in subarbol[var].items():
+        ramas = list(subarbol[var].items())
+        for i, (val, sub) in enumerate(ramas):
+            if max_nodos_visibles is not None and dibujados[0] >= max_nodos_visibles:
+                agregar_resumen(node_id, ramas[i:])
+                return
             agregar_nodos(sub, node_id, str(val))
-    
+
     try:
         agregar_nodos(arbol)
         dot.render(nombre_salida.replace('.pdf', ''), format='pdf', cleanup=True, view=False)
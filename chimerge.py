@@ -1,56 +1,77 @@
 import pandas as pd
-import sys
+import numpy as np
+import heapq
+from scipy.stats import chi2
+from concurrent.futures import ProcessPoolExecutor
+import multiprocessing
 import io
-import matplotlib.pyplot as plt
+from matplotlib.figure import Figure
 from matplotlib.backends.backend_pdf import PdfPages
 
+# Procesos como máximo por llamada a ajustar_chimerge
+MAX_PROCESOS = 2
+# El costo de Chi-Merge crece con los valores únicos; por debajo de este número en cada
+# columna, arrancar procesos (varios segundos) cuesta más que ajustar en serie
+VALORES_MIN_PARALELO = 250_000
+# Sin traza completa el reporte muestra solo estos primeros y últimos intervalos y fusiones
+PASOS_REPORTE = 20
+LINEAS_POR_PAGINA = 90
+
 def text_to_pdf(text, pdf):
-    """Agrega texto a una página en un PDF."""
-    fig = plt.figure(figsize=(8.27, 11.69))  # A4 size
-    plt.axis('off')
-    plt.text(0.05, 0.95, text, va='top', ha='left', wrap=True, fontsize=8, family='monospace')
-    pdf.savefig(fig)
-    plt.close(fig)
-
-def run_chimerge(file_path, output_pdf_path="chimerge_output.pdf", num_intervals_deseados1=3, num_intervals_deseados2=3):
+    """Agrega texto a un PDF, una página por cada LINEAS_POR_PAGINA líneas."""
+    lineas = text.splitlines()
+    for inicio in range(0, max(len(lineas), 1), LINEAS_POR_PAGINA):
+        fig = Figure(figsize=(8.27, 11.69))  # A4 size
+        ax = fig.subplots()
+        ax.axis('off')
+        ax.text(0.05, 0.95, '\n'.join(lineas[inicio:inicio + LINEAS_POR_PAGINA]),
+                va='top', ha='left', wrap=True, fontsize=8, family='monospace')
+        pdf.savefig(fig)
+
+def run_chimerge(file_path, output_pdf_path="chimerge_output.pdf", num_intervals_deseados1=3, num_intervals_deseados2=3,
+                 columnas=None, class_col='CLASE', max_intervalos=None, significancia=None, n_jobs=None,
+                 traza_completa=False):
     """
     Ejecuta la discretización Chi-Merge y guarda la salida de texto en un archivo PDF.
+    Por defecto discretiza las columnas 'X' e 'Y'; devuelve el modelo de cortes ajustado.
+    El reporte resume las fusiones salvo que se pida traza_completa.
+    Lanza KeyError si faltan columnas y ValueError si los datos no son válidos.
     """
-    # Redirigir stdout para capturar la salida
-    old_stdout = sys.stdout
-    sys.stdout = captured_output = io.StringIO()
-
-    print('--- Iniciando Discretización Chi-Merge ---')
-
-    try:
-        df = pd.read_csv(file_path)
-        df['X'] = pd.to_numeric(df['X'])
-        df['Y'] = pd.to_numeric(df['Y'])
-    except FileNotFoundError:
-        print(f"Error: El archivo {file_path} no fue encontrado.", file=sys.stderr)
-        sys.stdout = old_stdout # Restaurar stdout en caso de error
-        print(captured_output.getvalue(), file=sys.stderr)
-        sys.exit(1)
-    except (KeyError, ValueError) as e:
-        print(f"Error de datos: {e}", file=sys.stderr)
-        sys.stdout = old_stdout # Restaurar stdout
-        print(captured_output.getvalue(), file=sys.stderr)
-        sys.exit(1)
-
-    classes = df['CLASE'].unique().tolist()
-    if len(classes) != 2:
-        print(f"Error: Se requieren 2 clases, pero se encontraron {len(classes)}: {classes}", file=sys.stderr)
-        sys.stdout = old_stdout # Restaurar stdout
-        print(captured_output.getvalue(), file=sys.stderr)
-        sys.exit(1)
+    if columnas is None:
+        columnas = ['X', 'Y']
+        if max_intervalos is None:
+            max_intervalos = {'X': num_intervals_deseados1, 'Y': num_intervals_deseados2}
+    elif max_intervalos is None and significancia is None:
+        max_intervalos = num_intervals_deseados1
+
+    df = pd.read_csv(file_path)
+    faltantes = [c for c in list(columnas) + [class_col] if c not in df.columns]
+    if faltantes:
+        raise KeyError(f"Columnas no encontradas en el archivo: {faltantes}")
+    for col in columnas:
+        try:
+            df[col] = pd.to_numeric(df[col])
+        except ValueError:
+            raise ValueError(f"La columna '{col}' no pudo ser convertida a valores numéricos.")
+        if df[col].isna().all():
+            raise ValueError(f"La columna '{col}' no tiene valores numéricos.")
+
+    classes = df[class_col].dropna().unique().tolist()
+    if len(classes) < 2:
+        raise ValueError(f"Se requieren al menos 2 clases, pero se encontraron {len(classes)}: {classes}")
+
+    # Texto del reporte (sin redirigir sys.stdout, que comparten todos los hilos)
+    captured_output = io.StringIO()
+
+    print('--- Iniciando Discretización Chi-Merge ---', file=captured_output)
 
     # --- Procesar y capturar salida ---
-    discretize_column(df, 'X', 'CLASE', num_intervals_deseados1, classes)
-    print("\n" + "="*50 + "\n") # Separador
-    discretize_column(df, 'Y', 'CLASE', num_intervals_deseados2, classes)
+    modelo, pasos = ajustar_chimerge(df, columnas, class_col, max_intervalos, significancia, n_jobs, con_pasos=True)
+    for i, col in enumerate(columnas):
+        if i > 0:
+            print("\n" + "="*50 + "\n", file=captured_output) # Separador
+        imprimir_pasos(col, pasos[col], captured_output, traza_completa)
 
-    # --- Restaurar stdout y obtener el texto ---
-    sys.stdout = old_stdout
     output_text = captured_output.getvalue()
 
     # --- Guardar el texto en un PDF ---
@@ -60,68 +81,188 @@ def run_chimerge(file_path, output_pdf_path="chimerge_output.pdf", num_intervals
     print(f"Resultados de Chi-Merge guardados en '{output_pdf_path}'")
     # Opcional: imprimir también en la consola
     # print(output_text)
+    return modelo
 
 
-def discretize_column(df, feature_col, class_col, num_intervals_deseados, classes):
-    """Imprime los pasos de la discretización Chi-Merge para una columna."""
-    print(f"--- Discretizando columna '{feature_col}' ---")
-    
-    data = df[[feature_col, class_col]].sort_values(by=feature_col)
-    unique_vals = data[feature_col].unique()
+def ajustar_chimerge(df, columnas, class_col='CLASE', max_intervalos=3, significancia=None, n_jobs=None, con_pasos=False):
+    """
+    Ajusta Chi-Merge sobre varias columnas y devuelve el modelo {columna: cortes}.
+    Con más de VALORES_MIN_PARALELO valores únicos por columna se reparten en hasta MAX_PROCESOS procesos.
+    Los cortes son los límites inferiores de cada intervalo, en orden creciente.
+    max_intervalos puede ser un entero o un dict por columna; significancia (p. ej. 0.05)
+    detiene las fusiones cuando todos los pares adyacentes superan el umbral chi-cuadrado.
+    Las filas sin clase se descartan y los valores vacíos (NaN) no participan en el ajuste.
+    """
+    if max_intervalos is None and significancia is None:
+        raise ValueError("Se requiere 'max_intervalos' o 'significancia' como criterio de parada.")
 
-    intervals_data = [list(data[data[feature_col] == val].itertuples(index=False, name=None)) for val in unique_vals]
-    intervals_repr = [f"[{val},{val}]" for val in unique_vals]
+    # factorize marca los vacíos con -1 y, a diferencia de np.unique, tolera NaN junto a textos
+    codigos, clases = pd.factorize(df[class_col], sort=True)
+    con_clase = codigos >= 0
+    codigos = codigos[con_clase]
+    umbral = chi2.ppf(1 - significancia, len(clases) - 1) if significancia is not None else None
+    tareas = []
+    for col in columnas:
+        limite = max_intervalos.get(col) if isinstance(max_intervalos, dict) else max_intervalos
+        tareas.append((df[col].to_numpy()[con_clase], codigos, len(clases), limite, umbral))
 
-    print(f"Intervalos iniciales ({len(intervals_repr)}): {intervals_repr}\n")
+    procesos = min(n_jobs or MAX_PROCESOS, MAX_PROCESOS, len(tareas))
+    if procesos <= 1 or min(df[col].nunique() for col in columnas) < VALORES_MIN_PARALELO:
+        resultados = [_chimerge_columna(*t) for t in tareas]
+    else:
+        # 'spawn' evita heredar locks de otros hilos (p. ej. durante una respuesta en flujo)
+        with ProcessPoolExecutor(max_workers=procesos, mp_context=multiprocessing.get_context('spawn')) as executor:
+            resultados = list(executor.map(_chimerge_columna, *zip(*tareas)))
 
-    while len(intervals_repr) > num_intervals_deseados:
-        chi_squares = [calculate_chi_square(intervals_data[i], intervals_data[i+1], classes) for i in range(len(intervals_data) - 1)]
+    modelo = {col: cortes for col, (cortes, _) in zip(columnas, resultados)}
+    if con_pasos:
+        return modelo, {col: pasos for col, (_, pasos) in zip(columnas, resultados)}
+    return modelo
 
-        if not chi_squares:
-            break
 
-        min_chi = min(chi_squares)
-        min_index = chi_squares.index(min_chi)
+def aplicar_chimerge(df, modelo):
+    """
+    Asigna a cada fila el índice de intervalo de cada columna del modelo (una sola pasada vectorizada).
+    Los valores vacíos (NaN) reciben -1.
+    """
+    resultado = {}
+    for col, cortes in modelo.items():
+        valores = df[col].to_numpy(dtype=float)
+        indices = np.searchsorted(cortes[1:], valores, side='right')
+        resultado[col] = np.where(np.isnan(valores), -1, indices)
+    return pd.DataFrame(resultado, index=df.index)
 
-        # Imprimir el paso de fusión
-        print(f"Fusionando {intervals_repr[min_index]} y {intervals_repr[min_index+1]} (Chi-cuadrado = {min_chi:.4f})")
 
-        # Fusionar
-        intervals_data[min_index].extend(intervals_data[min_index + 1])
-        del intervals_data[min_index + 1]
+def _chimerge_columna(valores, codigos, n_clases, max_intervalos, umbral):
+    """
+    Ejecuta Chi-Merge sobre una columna a partir de la tabla de conteos por valor único y clase.
+    Los intervalos vivos forman una lista enlazada y los chi-cuadrado de los pares adyacentes
+    viven en un montículo; las entradas obsoletas se descartan al extraerlas (invalidación
+    perezosa), así cada fusión cuesta O(log n) en lugar de reconstruir los arreglos.
+    """
+    if valores.dtype.kind == 'f':
+        validos = ~np.isnan(valores)
+        valores, codigos = valores[validos], codigos[validos]
+    unicos, posiciones = np.unique(valores, return_inverse=True)
+    conteos_np = np.zeros((len(unicos), n_clases))
+    np.add.at(conteos_np, (posiciones, codigos), 1)
+    n = len(unicos)
+    finales = unicos.tolist()
+    pasos = [('inicio', list(zip(finales, finales)))]
 
-        start_val = intervals_repr[min_index].split(',')[0][1:]
-        end_val = intervals_repr[min_index + 1].split(',')[1][:-1]
-        intervals_repr[min_index] = f"[{start_val},{end_val}]"
-        del intervals_repr[min_index + 1]
+    conteos = conteos_np.tolist()
+    inicios = list(finales)
+    siguiente = list(range(1, n)) + [-1]
+    anterior = list(range(-1, n - 1))
+    version = [0] * n
+    vivo = [True] * n
+    chis_iniciales = calculate_chi_square_pares(conteos_np[:-1], conteos_np[1:]).tolist() if n > 1 else []
+    # Entradas (chi, i, versión de i, j, versión de j): ante un empate gana el par más a la izquierda
+    monticulo = [(chi, i, 0, i + 1, 0) for i, chi in enumerate(chis_iniciales)]
+    heapq.heapify(monticulo)
 
-    print(f'\nIntervalos finales para {feature_col}:')
-    print(intervals_repr)
+    def empujar(i):
+        j = siguiente[i]
+        if i >= 0 and j >= 0:
+            heapq.heappush(monticulo, (_chi_cuadrado_par(conteos[i], conteos[j]), i, version[i], j, version[j]))
 
+    intervalos = n
+    while intervalos > 1 and monticulo:
+        if max_intervalos is not None and intervalos <= max_intervalos:
+            break
+        chi, i, version_i, j, version_j = monticulo[0]
+        if not (vivo[i] and vivo[j] and version[i] == version_i and version[j] == version_j):
+            heapq.heappop(monticulo)
+            continue
+        if umbral is not None and chi >= umbral:
+            break
+        heapq.heappop(monticulo)
+        pasos.append(('fusion', (inicios[i], finales[i]), (inicios[j], finales[j]), chi))
 
-def calculate_chi_square(interval1, interval2, classes):
-    """Calcula el valor de chi-cuadrado entre dos intervalos."""
-    class1, class2 = classes[0], classes[1]
-    A1 = sum(1 for _, c in interval1 if c == class1)
-    B1 = sum(1 for _, c in interval1 if c == class2)
-    A2 = sum(1 for _, c in interval2 if c == class1)
-    B2 = sum(1 for _, c in interval2 if c == class2)
+        # Fusionar el intervalo j en i y recalcular solo los pares vecinos
+        conteos[i] = [a + b for a, b in zip(conteos[i], conteos[j])]
+        finales[i] = finales[j]
+        vivo[j] = False
+        siguiente[i] = siguiente[j]
+        if siguiente[j] >= 0:
+            anterior[siguiente[j]] = i
+        version[i] += 1
+        intervalos -= 1
+        empujar(anterior[i])
+        empujar(i)
 
-    sum_row1, sum_row2 = A1 + B1, A2 + B2
-    sum_colA, sum_colB = A1 + A2, B1 + B2
-    total = sum_row1 + sum_row2
+    # Compactar una sola vez al final
+    vivos = [i for i in range(n) if vivo[i]]
+    pasos.append(('final', [(inicios[i], finales[i]) for i in vivos]))
+    return unicos[vivos], pasos
 
-    if total == 0: return 0.0
 
+def _chi_cuadrado_par(fila1, fila2):
+    """Chi-cuadrado de dos intervalos adyacentes (listas de conteos por clase)."""
+    suma1, suma2 = sum(fila1), sum(fila2)
+    total = suma1 + suma2
+    if total == 0:
+        return 0.0
     chi_sq = 0.0
-    for obs, s_row, s_col in [(A1, sum_row1, sum_colA), (B1, sum_row1, sum_colB), 
-                               (A2, sum_row2, sum_colA), (B2, sum_row2, sum_colB)]:
-        if s_row > 0 and s_col > 0:
-            expected = (s_row * s_col) / total
+    for a, b in zip(fila1, fila2):
+        suma_col = a + b
+        if suma_col == 0:
+            continue
+        for obs, s_row in ((a, suma1), (b, suma2)):
+            expected = s_row * suma_col / total
             if expected > 0:
                 chi_sq += ((obs - expected) ** 2) / expected
     return chi_sq
 
 
+def _recortar(elementos, traza_completa):
+    """Primeros y últimos PASOS_REPORTE elementos, y cuántos se omitieron entre ambos."""
+    if traza_completa or len(elementos) <= 2 * PASOS_REPORTE:
+        return elementos, 0, []
+    return elementos[:PASOS_REPORTE], len(elementos) - 2 * PASOS_REPORTE, elementos[-PASOS_REPORTE:]
+
+
+def imprimir_pasos(feature_col, pasos, salida=None, traza_completa=False):
+    """
+    Imprime los pasos de la discretización Chi-Merge para una columna en salida (por defecto stdout).
+    Salvo con traza_completa, de los intervalos iniciales y de las fusiones solo se imprimen
+    los PASOS_REPORTE primeros y últimos.
+    """
+    print(f"--- Discretizando columna '{feature_col}' ---", file=salida)
+    fusiones = [paso for paso in pasos if paso[0] == 'fusion']
+    for paso in pasos:
+        if paso[0] == 'inicio':
+            primeros, omitidos, ultimos = _recortar([f"[{a},{b}]" for a, b in paso[1]], traza_completa)
+            intervalos = primeros + ([f"... ({omitidos} más)"] if omitidos else []) + ultimos
+            print(f"Intervalos iniciales ({len(paso[1])}): {intervalos}\n", file=salida)
+        elif paso[0] == 'final':
+            primeras, omitidas, ultimas = _recortar(fusiones, traza_completa)
+            for fusion in primeras:
+                _imprimir_fusion(fusion, salida)
+            if omitidas:
+                print(f"... {omitidas} fusiones omitidas ...", file=salida)
+            for fusion in ultimas:
+                _imprimir_fusion(fusion, salida)
+            print(f'\nIntervalos finales para {feature_col}:', file=salida)
+            print([f"[{a},{b}]" for a, b in paso[1]], file=salida)
+
+
+def _imprimir_fusion(paso, salida):
+    (a1, b1), (a2, b2), chi = paso[1], paso[2], paso[3]
+    print(f"Fusionando [{a1},{b1}] y [{a2},{b2}] (Chi-cuadrado = {chi:.4f})", file=salida)
+
+
+def calculate_chi_square_pares(filas1, filas2):
+    """Calcula el chi-cuadrado de cada par de intervalos adyacentes (filas de conteos por clase)."""
+    tabla = np.stack([filas1, filas2], axis=1)  # (pares, 2, clases)
+    suma_filas = tabla.sum(axis=2, keepdims=True)
+    suma_cols = tabla.sum(axis=1, keepdims=True)
+    total = suma_filas.sum(axis=1, keepdims=True)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        esperado = suma_filas * suma_cols / total
+        terminos = np.where(esperado > 0, (tabla - esperado) ** 2 / esperado, 0.0)
+    return terminos.sum(axis=(1, 2))
+
+
 if __name__ == '__main__':
     run_chimerge('your_data.csv')
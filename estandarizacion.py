@@ -1,11 +1,12 @@
 import pandas as pd
 from sklearn.preprocessing import StandardScaler
-import matplotlib.pyplot as plt
+from matplotlib.figure import Figure
 from matplotlib.backends.backend_pdf import PdfPages
 
 def df_to_pdf(df, path="estandarizacion_output.pdf"):
     """Guarda un DataFrame de pandas en un archivo PDF."""
-    fig, ax = plt.subplots(figsize=(8.27, 11.69)) # Tamaño A4
+    fig = Figure(figsize=(8.27, 11.69)) # Tamaño A4
+    ax = fig.subplots()
     ax.axis('tight')
     ax.axis('off')
     tabla = ax.table(cellText=df.values, colLabels=df.columns, loc='center', cellLoc='center')
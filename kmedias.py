@@ -1,18 +1,20 @@
 import pandas as pd
+import numpy as np
 import seaborn as sns
-import matplotlib.pyplot as plt
+from matplotlib.figure import Figure
 from sklearn.model_selection import train_test_split
 from sklearn import preprocessing
-from sklearn.cluster import KMeans
+from sklearn.cluster import KMeans, MiniBatchKMeans
 from sklearn.metrics import silhouette_score
 from matplotlib.backends.backend_pdf import PdfPages
+import almacen
 
 def run_kmedias(file_path, output_pdf_path="kmedias_output.pdf"):
     """
     Ejecuta un análisis de K-Medias y guarda todos los gráficos en un archivo PDF.
     """
     try:
-        home_data = pd.read_csv(file_path, usecols=['longitude', 'latitude', 'median_house_value'])
+        home_data = almacen.a_dataframe(file_path, ['longitude', 'latitude', 'median_house_value'])
     except FileNotFoundError:
         print(f"Error: El archivo '{file_path}' no fue encontrado.")
         return
@@ -22,11 +24,11 @@ def run_kmedias(file_path, output_pdf_path="kmedias_output.pdf"):
 
     with PdfPages(output_pdf_path) as pdf:
         # --- Gráfico 1: Visualización inicial de datos ---
-        fig = plt.figure()
-        sns.scatterplot(data=home_data, x='longitude', y='latitude', hue='median_house_value')
-        plt.title('Distribución Geográfica vs. Valor Mediano de la Vivienda')
+        fig = Figure()
+        ax = fig.subplots()
+        sns.scatterplot(data=home_data, x='longitude', y='latitude', hue='median_house_value', ax=ax)
+        ax.set_title('Distribución Geográfica vs. Valor Mediano de la Vivienda')
         pdf.savefig(fig)
-        plt.close(fig)
 
         # --- Preparación de datos ---
         X_train, _, y_train, _ = train_test_split(
@@ -40,18 +42,18 @@ def run_kmedias(file_path, output_pdf_path="kmedias_output.pdf"):
         # --- Gráfico 2: Clustering inicial (k=3) ---
         kmeans_3 = KMeans(n_clusters=3, random_state=0, n_init='auto')
         kmeans_3.fit(X_train_norm)
-        fig = plt.figure()
-        sns.scatterplot(data=X_train, x='longitude', y='latitude', hue=kmeans_3.labels_)
-        plt.title('Clusters de Viviendas (k=3)')
+        fig = Figure()
+        ax = fig.subplots()
+        sns.scatterplot(data=X_train, x='longitude', y='latitude', hue=kmeans_3.labels_, ax=ax)
+        ax.set_title('Clusters de Viviendas (k=3)')
         pdf.savefig(fig)
-        plt.close(fig)
 
         # --- Gráfico 3: Boxplot de valor por cluster (k=3) ---
-        fig = plt.figure()
-        sns.boxplot(x=kmeans_3.labels_, y=y_train['median_house_value'])
-        plt.title('Valor Mediano de Vivienda por Cluster (k=3)')
+        fig = Figure()
+        ax = fig.subplots()
+        sns.boxplot(x=kmeans_3.labels_, y=y_train['median_house_value'], ax=ax)
+        ax.set_title('Valor Mediano de Vivienda por Cluster (k=3)')
         pdf.savefig(fig)
-        plt.close(fig)
 
         # --- Búsqueda del K óptimo ---
         K = range(2, 8)
@@ -63,13 +65,13 @@ def run_kmedias(file_path, output_pdf_path="kmedias_output.pdf"):
             scores.append(silhouette_score(X_train_norm, model.labels_, metric='euclidean'))
 
         # --- Gráfico 4: Puntuación de Silueta vs. K ---
-        fig = plt.figure()
-        sns.lineplot(x=K, y=scores)
-        plt.title('Puntuación de Silueta para Diferentes K')
-        plt.xlabel('Número de Clusters (K)')
-        plt.ylabel('Puntuación de Silueta')
+        fig = Figure()
+        ax = fig.subplots()
+        sns.lineplot(x=K, y=scores, ax=ax)
+        ax.set_title('Puntuación de Silueta para Diferentes K')
+        ax.set_xlabel('Número de Clusters (K)')
+        ax.set_ylabel('Puntuación de Silueta')
         pdf.savefig(fig)
-        plt.close(fig)
         
         # Encontrar el mejor k según la puntuación de silueta
         best_k_index = scores.index(max(scores))
@@ -77,21 +79,120 @@ def run_kmedias(file_path, output_pdf_path="kmedias_output.pdf"):
         best_fit = fits[best_k_index]
 
         # --- Gráfico 5: Mejor clustering según silueta ---
-        fig = plt.figure()
-        sns.scatterplot(data=X_train, x='longitude', y='latitude', hue=best_fit.labels_)
-        plt.title(f'Mejor Clustering Encontrado (k={best_k})')
+        fig = Figure()
+        ax = fig.subplots()
+        sns.scatterplot(data=X_train, x='longitude', y='latitude', hue=best_fit.labels_, ax=ax)
+        ax.set_title(f'Mejor Clustering Encontrado (k={best_k})')
         pdf.savefig(fig)
-        plt.close(fig)
 
         # --- Gráfico 6: Boxplot del mejor clustering ---
-        fig = plt.figure()
-        sns.boxplot(x=best_fit.labels_, y=y_train['median_house_value'])
-        plt.title(f'Valor Mediano de Vivienda por Cluster (k={best_k})')
+        fig = Figure()
+        ax = fig.subplots()
+        sns.boxplot(x=best_fit.labels_, y=y_train['median_house_value'], ax=ax)
+        ax.set_title(f'Valor Mediano de Vivienda por Cluster (k={best_k})')
         pdf.savefig(fig)
-        plt.close(fig)
 
     print(f"Análisis de K-Medias completado. Gráficos guardados en '{output_pdf_path}'")
 
+def leer_coordenadas(file_path, chunksize, columnas=('latitude', 'longitude')):
+    """Itera el CSV por bloques con solo las columnas solicitadas; el índice es el número de fila original."""
+    for chunk in pd.read_csv(file_path, usecols=list(columnas), chunksize=chunksize):
+        yield chunk
+
+def run_kmedias_streaming(file_path, output_pdf_path="kmedias_output.pdf", n_clusters=3, chunksize=100_000,
+                          epochs=3, tol=1e-4, max_muestra=20_000, labels_path=None):
+    """
+    Ejecuta K-Medias por bloques (MiniBatchKMeans.partial_fit) para archivos que no caben en memoria.
+    Una segunda pasada asigna las etiquetas y las escribe en labels_path (CSV), con el número
+    de fila de origen en la columna 'fila' y el cluster vacío en las filas sin coordenadas.
+    Devuelve el historial de convergencia por época.
+    """
+    if labels_path is None:
+        labels_path = output_pdf_path.replace('.pdf', '_labels.csv')
+
+    model = MiniBatchKMeans(n_clusters=n_clusters, random_state=0, batch_size=min(chunksize, 4096), n_init=3)
+    historial = []
+    centros_previos = None
+    try:
+        for epoca in range(1, epochs + 1):
+            inercia, n = 0.0, 0
+            for chunk in leer_coordenadas(file_path, chunksize):
+                chunk = chunk.dropna()
+                if len(chunk) < n_clusters and not hasattr(model, 'cluster_centers_'):
+                    continue
+                X = preprocessing.normalize(chunk[['latitude', 'longitude']])
+                model.partial_fit(X)
+                inercia += -model.score(X)
+                n += len(X)
+            if n == 0:
+                print(f"Error: El archivo '{file_path}' no tiene suficientes filas para {n_clusters} clusters.")
+                return None
+            desplazamiento = None if centros_previos is None else float(np.linalg.norm(model.cluster_centers_ - centros_previos))
+            centros_previos = model.cluster_centers_.copy()
+            historial.append({'epoca': epoca, 'inercia_media': inercia / n, 'desplazamiento': desplazamiento})
+            print(f"Época {epoca}: inercia media = {inercia / n:.6g}, desplazamiento de centroides = {desplazamiento}")
+            if desplazamiento is not None and desplazamiento < tol:
+                break
+    except FileNotFoundError:
+        print(f"Error: El archivo '{file_path}' no fue encontrado.")
+        return None
+    except Exception as e:
+        print(f"Error al leer el archivo CSV: {e}")
+        return None
+
+    # --- Segunda pasada: asignación de etiquetas ---
+    rng = np.random.default_rng(0)
+    tamanos = np.zeros(n_clusters, dtype=np.int64)
+    muestra = None
+    with open(labels_path, 'w', newline='') as salida:
+        for i, chunk in enumerate(leer_coordenadas(file_path, chunksize)):
+            # Las filas sin coordenadas se conservan con el cluster vacío para poder unirlas al origen
+            validas = chunk[['latitude', 'longitude']].notna().all(axis=1).to_numpy()
+            clusters = pd.Series(pd.NA, index=chunk.index, dtype='Int64')
+            if validas.any():
+                etiquetas = model.predict(preprocessing.normalize(chunk.loc[validas, ['latitude', 'longitude']]))
+                tamanos += np.bincount(etiquetas, minlength=n_clusters)
+                clusters[validas] = etiquetas
+            chunk = chunk.assign(cluster=clusters)
+            chunk.to_csv(salida, header=(i == 0), index=True, index_label='fila')
+            chunk = chunk[validas]
+            # Muestreo de reservorio: cada fila recibe una clave aleatoria y se conservan las
+            # max_muestra menores, así la muestra es uniforme sobre todo el archivo
+            candidatos = chunk.assign(_clave=rng.random(len(chunk)))
+            if muestra is not None:
+                candidatos = pd.concat([muestra, candidatos])
+            muestra = candidatos.nsmallest(max_muestra, '_clave')
+
+    with PdfPages(output_pdf_path) as pdf:
+        # --- Gráfico 1: Convergencia por época ---
+        fig = Figure()
+        ax = fig.subplots()
+        sns.lineplot(x=[h['epoca'] for h in historial], y=[h['inercia_media'] for h in historial], marker='o', ax=ax)
+        ax.set_title('Convergencia de MiniBatchKMeans')
+        ax.set_xlabel('Época')
+        ax.set_ylabel('Inercia media')
+        pdf.savefig(fig)
+
+        # --- Gráfico 2: Muestra de clusters ---
+        if muestra is not None and len(muestra):
+            fig = Figure()
+            ax = fig.subplots()
+            sns.scatterplot(data=muestra, x='longitude', y='latitude', hue='cluster', s=5, ax=ax)
+            ax.set_title(f'Clusters de Viviendas (k={n_clusters}, muestra de {len(muestra)} filas)')
+            pdf.savefig(fig)
+
+        # --- Gráfico 3: Tamaño de cada cluster ---
+        fig = Figure()
+        ax = fig.subplots()
+        sns.barplot(x=list(range(n_clusters)), y=tamanos, ax=ax)
+        ax.set_title('Filas por Cluster')
+        ax.set_xlabel('Cluster')
+        ax.set_ylabel('Filas')
+        pdf.savefig(fig)
+
+    print(f"Análisis de K-Medias por bloques completado. Gráficos guardados en '{output_pdf_path}', etiquetas en '{labels_path}'")
+    return historial
+
 if __name__ == '__main__':
     # Reemplaza 'housing.csv' con la ruta a tu archivo de datos.
     run_kmedias('housing.csv')
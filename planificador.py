@@ -0,0 +1,155 @@
+import contextlib
+import fcntl
+import json
+import math
+import os
+import tempfile
+import time
+import uuid
+
+# Costo aproximado por algoritmo:
+#   memoria  -> múltiplo del tamaño del archivo que ocupa en RAM
+#   cpu      -> núcleos que usa (None = todos los disponibles)
+#   segundos -> segundos estimados por millón de filas
+#   ligero   -> transformaciones baratas que no deben esperar a los trabajos pesados
+COSTOS = {
+    'ESTANDARIZACION': {'memoria': 3, 'cpu': 1, 'segundos': 5, 'ligero': True},
+    'NORMALIZACION': {'memoria': 3, 'cpu': 1, 'segundos': 5, 'ligero': True},
+    'ESCALA_LOG': {'memoria': 3, 'cpu': 1, 'segundos': 5, 'ligero': True},
+    'CHIMERGE': {'memoria': 4, 'cpu': 2, 'segundos': 20, 'ligero': False},
+    'KMODAS': {'memoria': 4, 'cpu': None, 'segundos': 60, 'ligero': False},
+    'KMEDIAS': {'memoria': 6, 'cpu': None, 'segundos': 120, 'ligero': False},
+    'ARBOL': {'memoria': 12, 'cpu': 1, 'segundos': 300, 'ligero': False},
+}
+COSTO_POR_DEFECTO = {'memoria': 4, 'cpu': 1, 'segundos': 60, 'ligero': False}
+
+# Registro compartido por todos los workers de gunicorn: el presupuesto es de la máquina, no del proceso.
+RUTA_REGISTRO = os.environ.get('ANALYTICA_REGISTRO_PLANIFICADOR',
+                               os.path.join(tempfile.gettempdir(), 'analyticapro_planificador.json'))
+
+
+def memoria_fisica():
+    """Memoria física total en bytes, o 2 GB si no se puede determinar."""
+    try:
+        return os.sysconf('SC_PAGE_SIZE') * os.sysconf('SC_PHYS_PAGES')
+    except (ValueError, OSError, AttributeError):
+        return 2 * 1024 ** 3
+
+
+def proceso_vivo(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def estimar_filas(data_path, muestra=64 * 1024):
+    """Estima el número de filas de un CSV a partir del largo medio de línea de su primer bloque."""
+    tamano = os.path.getsize(data_path)
+    with open(data_path, 'rb') as f:
+        bloque = f.read(muestra)
+    lineas = bloque.count(b'\n')
+    if lineas == 0 or len(bloque) >= tamano:
+        return max(lineas, 1)
+    return int(tamano / (len(bloque) / lineas))
+
+
+class Planificador:
+    """
+    Control de admisión para /algoritmos según un presupuesto de CPU y memoria.
+    Los trabajos en curso se anotan en un registro en disco protegido con flock, así que
+    todos los workers comparten el mismo presupuesto. Los trabajos pesados solo pueden
+    usar la parte del presupuesto que no está reservada para los ligeros, así una
+    transformación barata nunca queda detrás de un clustering.
+    """
+
+    def __init__(self, cpu_total=None, memoria_total=None, reserva_ligera=0.25, ruta_registro=None):
+        self.cpu_total = cpu_total or os.cpu_count() or 1
+        self.memoria_total = memoria_total or memoria_fisica() // 2
+        self.reserva_ligera = reserva_ligera
+        self.ruta_registro = ruta_registro or RUTA_REGISTRO
+
+    @contextlib.contextmanager
+    def _registro(self):
+        """Abre el registro con bloqueo exclusivo y guarda los cambios al salir."""
+        fd = os.open(self.ruta_registro, os.O_RDWR | os.O_CREAT, 0o666)
+        with os.fdopen(fd, 'r+', encoding='utf-8') as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                activos = json.loads(f.read() or '{}')
+            except ValueError:
+                activos = {}
+            # Un worker muerto (p. ej. por OOM) no vuelve a liberar sus tickets
+            activos = {t: e for t, e in activos.items() if proceso_vivo(e['pid'])}
+            yield activos
+            f.seek(0)
+            f.truncate()
+            json.dump(activos, f)
+            f.flush()
+
+    def estimar_costo(self, algoritmo, data_path, opciones=None):
+        """
+        Devuelve el costo estimado (cpu, memoria en bytes, segundos, ligero) de una petición.
+        Lanza OSError si data_path no se puede leer.
+        """
+        opciones = opciones or {}
+        costo = COSTOS.get(algoritmo, COSTO_POR_DEFECTO)
+        tamano = os.path.getsize(data_path)
+        filas = estimar_filas(data_path)
+        memoria = tamano * costo['memoria']
+        if algoritmo == 'KMEDIAS' and opciones.get('modo') == 'streaming':
+            # Solo un bloque de filas vive en memoria a la vez
+            chunksize = opciones.get('chunksize', 100_000)
+            memoria = min(memoria, (tamano / max(filas, 1)) * chunksize * costo['memoria'])
+        # Cada carril se limita a su parte del presupuesto para que ninguno acapare la CPU, y un
+        # trabajo pesado nunca reserva la memoria apartada para los ligeros
+        if costo['ligero']:
+            carril = self.cpu_total * self.reserva_ligera
+        else:
+            carril = self.cpu_total * (1.0 - self.reserva_ligera)
+            memoria = min(memoria, self.memoria_total * (1.0 - self.reserva_ligera))
+        cpu = min(costo['cpu'] or self.cpu_total, carril)
+        segundos = max(1.0, costo['segundos'] * filas / 1e6)
+        return {'cpu': cpu, 'memoria': memoria, 'segundos': segundos, 'ligero': costo['ligero']}
+
+    def admitir(self, algoritmo, data_path, opciones=None):
+        """
+        Intenta admitir una petición. Devuelve (ticket, None) si se admite,
+        o (None, retry_after) con los segundos sugeridos para reintentar.
+        """
+        costo = self.estimar_costo(algoritmo, data_path, opciones)
+        with self._registro() as activos:
+            cpu_usada = sum(e['cpu'] for e in activos.values())
+            memoria_usada = sum(e['memoria'] for e in activos.values())
+            limite = 1.0 if costo['ligero'] else 1.0 - self.reserva_ligera
+            cabe = (cpu_usada + costo['cpu'] <= self.cpu_total * limite
+                    and memoria_usada + costo['memoria'] <= self.memoria_total * limite)
+            # Un trabajo más grande que todo el presupuesto solo se admite si corre solo
+            if cabe or not activos:
+                ticket = f"{os.getpid()}-{uuid.uuid4().hex}"
+                activos[ticket] = dict(costo, pid=os.getpid(), inicio=time.time())
+                return ticket, None
+            return None, self._retry_after(activos)
+
+    def liberar(self, ticket):
+        with self._registro() as activos:
+            activos.pop(ticket, None)
+
+    def _retry_after(self, activos):
+        ahora = time.time()
+        restantes = [e['inicio'] + e['segundos'] - ahora for e in activos.values()]
+        return max(1, math.ceil(min(restantes)))
+
+
+def desde_entorno():
+    """Crea el planificador con el presupuesto definido en variables de entorno, si existen."""
+    cpu = os.environ.get('ANALYTICA_CPU_BUDGET')
+    memoria_mb = os.environ.get('ANALYTICA_MEM_BUDGET_MB')
+    return Planificador(
+        cpu_total=float(cpu) if cpu else None,
+        memoria_total=int(memoria_mb) * 1024 ** 2 if memoria_mb else None,
+        reserva_ligera=float(os.environ.get('ANALYTICA_RESERVA_LIGERA', 0.25))
+    )
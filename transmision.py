@@ -0,0 +1,135 @@
+import io
+import queue
+import sys
+import threading
+
+
+class Cancelado(Exception):
+    """El cliente cerró la conexión antes de terminar de recibir el PDF."""
+
+
+class SalidaEnBloques:
+    """
+    Archivo de solo escritura que entrega a una respuesta HTTP los bytes que PdfPages va
+    escribiendo, de modo que cada página sale en cuanto se guarda la figura.
+    Implementa tell() para que matplotlib escriba directamente sin acumular el PDF en memoria.
+    """
+
+    def __init__(self, max_pendientes=256):
+        self._cola = queue.Queue(maxsize=max_pendientes)
+        self._posicion = 0
+        self._cancelado = threading.Event()
+        self._listo = threading.Event()
+        self.error = None
+
+    def __str__(self):
+        return '<respuesta HTTP>'
+
+    def write(self, data):
+        if not data:
+            return 0
+        bloque = bytes(data)
+        # Si el cliente no consume, el algoritmo espera (contrapresión) hasta que cancele
+        while True:
+            if self._cancelado.is_set():
+                raise Cancelado()
+            try:
+                self._cola.put(bloque, timeout=1)
+                break
+            except queue.Full:
+                continue
+        self._posicion += len(bloque)
+        self._listo.set()
+        return len(bloque)
+
+    def tell(self):
+        return self._posicion
+
+    def seekable(self):
+        return False
+
+    def seek(self, *args):
+        raise io.UnsupportedOperation('seek')
+
+    def flush(self):
+        pass
+
+    def writable(self):
+        return True
+
+    def cerrar(self):
+        self._listo.set()
+        while not self._cancelado.is_set():
+            try:
+                self._cola.put(None, timeout=1)
+                return
+            except queue.Full:
+                continue
+
+    def bloques(self):
+        """Generador para la respuesta: agrupa lo que ya está escrito y lo entrega de inmediato."""
+        try:
+            while True:
+                bloque = self._cola.get()
+                if bloque is None:
+                    return
+                partes = [bloque]
+                while True:
+                    try:
+                        siguiente = self._cola.get_nowait()
+                    except queue.Empty:
+                        break
+                    if siguiente is None:
+                        yield b''.join(partes)
+                        return
+                    partes.append(siguiente)
+                yield b''.join(partes)
+        finally:
+            self._cancelado.set()
+            # Vaciar la cola para liberar a un escritor bloqueado
+            while True:
+                try:
+                    self._cola.get_nowait()
+                except queue.Empty:
+                    break
+
+
+def ejecutar_en_flujo(tarea, al_terminar=None):
+    """
+    Ejecuta tarea(salida) en un hilo y devuelve el generador de bloques del PDF.
+    Espera a que la tarea escriba su primer bloque (PdfPages no escribe nada hasta guardar
+    la primera figura) para que los errores tempranos no lleguen como un 200 vacío: si la
+    tarea termina sin escribir nada, relanza su excepción o devuelve None.
+    al_terminar se llama siempre al final, haya terminado bien, con error o cancelado.
+    """
+    salida = SalidaEnBloques()
+
+    def trabajo():
+        try:
+            tarea(salida)
+        except Cancelado:
+            print("Transmisión cancelada por el cliente.", file=sys.stderr)
+        except BaseException as e:
+            if salida._cancelado.is_set():
+                # Al cerrar PdfPages tras un Cancelado a mitad de página, el flujo zlib queda
+                # inconsistente y su error reemplaza al Cancelado original
+                print("Transmisión cancelada por el cliente.", file=sys.stderr)
+                return
+            salida.error = e
+            print(f"Error durante la transmisión del PDF: {e}", file=sys.stderr)
+        finally:
+            try:
+                salida.cerrar()
+            finally:
+                if al_terminar:
+                    al_terminar()
+
+    hilo = threading.Thread(target=trabajo, daemon=True)
+    hilo.start()
+    salida._listo.wait()
+    if salida.tell() == 0:
+        hilo.join()
+        if salida.error is not None:
+            raise salida.error
+        return None
+    return salida.bloques()